@@ -1,16 +1,37 @@
 #!/usr/bin/env python3
 """
 Fetch Dune quote>exec data and create scatter plot grouped by venue.
-Sends the plot to Slack webhook.
+Uploads the plot to Slack with the summary, falling back to a text-only webhook post.
 """
 
 import os
 import io
-import base64
+import sys
+import json
+import time
+import logging
+import hashlib
+import tempfile
 import requests
+import numpy as np
 import pandas as pd
+import matplotlib
+
+# Headless Agg backend: skip GUI toolkit probing on cron runners
+matplotlib.use('Agg')
+matplotlib.rcParams.update({
+    'figure.autolayout': False,
+    'axes.unicode_minus': False,
+    'path.simplify_threshold': 1.0,
+})
+
+import matplotlib.dates as mdates
 import matplotlib.pyplot as plt
+from matplotlib.lines import Line2D
 from datetime import datetime, timezone
+from pathlib import Path
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dune_client.client import DuneClient
 from dune_client.query import QueryBase
 from dotenv import load_dotenv
@@ -18,64 +39,211 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
+# Unknown LOG_LEVEL values fall back to WARNING rather than failing at import
+LOG_LEVEL = getattr(logging, os.getenv("LOG_LEVEL", "WARNING").upper(), None)
+if not isinstance(LOG_LEVEL, int):
+    LOG_LEVEL = logging.WARNING
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(message)s")
+log = logging.getLogger(__name__)
+
 DUNE_API_KEY = os.getenv("DUNE_API_KEY")
 SLACK_WEBHOOK_URL = os.getenv("SLACK_WEBHOOK_URL")
+SLACK_BOT_TOKEN = os.getenv("SLACK_BOT_TOKEN")  # needs the chat:write, files:write and files:read scopes
+SLACK_CHANNEL_ID = os.getenv("SLACK_CHANNEL_ID")
 QUERY_ID = 6720892  # Your Dune query ID
 
+# Local cache of Dune results, reused for CACHE_TTL_SECONDS unless FORCE_REFRESH is set
+CACHE_DIR = os.getenv("CACHE_DIR", "cache")
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "900"))
+FORCE_REFRESH = os.getenv("FORCE_REFRESH", "").lower() in ("1", "true", "yes")
+LAST_RUN_PATH = os.path.join(CACHE_DIR, "last_run.json")
+
+# Shared HTTP session so Slack POSTs reuse pooled keep-alive connections,
+# retrying with exponential backoff only where the POST can't have gone through:
+# connect failures and 429 rate limits. Read timeouts and 5xx are not retried,
+# since Slack may already have posted the message.
+HTTP_TIMEOUT = (3.05, 10)  # (connect, read) seconds
+HTTP_RETRY = Retry(
+    total=3,
+    read=0,
+    backoff_factor=0.5,
+    status_forcelist=[429],
+    allowed_methods=frozenset(['POST']),
+    raise_on_status=False
+)
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=4, max_retries=HTTP_RETRY))
+
+# Quantiles reported overall and per venue
+QUANTILES = {'q25': 0.25, 'q50': 0.50, 'q75': 0.75, 'q95': 0.95}
+
+# Rendering settings for the chart image
+IMAGE_FILENAME = 'quote_exec_scatter.png'
+IMAGE_DPI = 100
+IMAGE_SAVE_KWARGS = {'format': 'png', 'dpi': IMAGE_DPI, 'pil_kwargs': {'optimize': True}}
+
+# Above this many points the scatter is binned into a pixel image instead
+DENSITY_THRESHOLD = 50_000
+DENSITY_SPREAD_PX = 2
+
 
 def fetch_dune_data():
     """Fetch latest results from Dune query."""
-    print(f"Fetching data from Dune query {QUERY_ID}...")
+    log.info("Fetching data from Dune query %s...", QUERY_ID)
     dune = DuneClient(DUNE_API_KEY)
 
     # First try to get latest results, if that fails, execute the query
     try:
         query_result = dune.get_latest_result(QUERY_ID)
     except Exception as e:
-        print(f"No cached results found, executing query... ({e})")
+        log.info("No cached results found, executing query... (%s)", e)
         query = QueryBase(query_id=QUERY_ID)
         query_result = dune.run_query(query)
 
-    # Convert to DataFrame
+    # Convert to DataFrame, building whole columns rather than pivoting row dicts
     rows = query_result.result.rows
-    df = pd.DataFrame(rows)
-    print(f"Fetched {len(df)} rows")
+    columns = {key: [row[key] for row in rows] for key in rows[0]} if rows else {}
+    df = pd.DataFrame(columns, copy=False)
+
+    if not df.empty:
+        # Categorical venue turns every later groupby/unique into integer-code work
+        df['venue'] = df['venue'].astype('category')
+        df['wide_bps'] = pd.to_numeric(df['wide_bps']).astype('float32')
+        df['block_time'] = pd.to_datetime(df['block_time'], utc=True, cache=True)
+
+    log.info("Fetched %d rows", len(df))
+    return df
+
+
+def load_dune_data():
+    """Return Dune results from the local cache if fresh, otherwise fetch and cache them."""
+    cache_path = os.path.join(CACHE_DIR, f"dune_{QUERY_ID}.parquet")
+
+    if not FORCE_REFRESH and os.path.exists(cache_path):
+        age = time.time() - os.path.getmtime(cache_path)
+        if age < CACHE_TTL_SECONDS:
+            try:
+                df = pd.read_parquet(cache_path)
+            except Exception as e:
+                # A corrupt cache file shouldn't break the run; refetch and overwrite it
+                log.warning("Ignoring unreadable cache file %s: %s", cache_path, e)
+            else:
+                log.info("Loaded %d rows from cache (%.0fs old)", len(df), age)
+                return df
+
+    df = fetch_dune_data()
+
+    # Don't cache empty results so the next run tries Dune again
+    if not df.empty:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # Write to a temp file and rename it into place so a partial write never looks valid
+        fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix='.parquet.tmp')
+        os.close(fd)
+        try:
+            df.to_parquet(tmp_path, compression='zstd')
+            os.replace(tmp_path, cache_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
     return df
 
 
-def create_scatter_plot(df):
+def draw_density(ax, df, codes, palette):
+    """Bin points per venue into an axes-sized pixel grid with numpy and draw it as one image."""
+    x = mdates.date2num(df['block_time'])
+    y = df['wide_bps'].to_numpy()
+    # y spans the axes' (padded) limits so the image lines up with the ticks
+    x_range = (x.min(), x.max())
+    y_range = ax.get_ylim()
+
+    # One bin per axes pixel in the saved image, so nothing is resampled away
+    bbox = ax.get_window_extent()
+    width = max(int(round(bbox.width)), 1)
+    height = max(int(round(bbox.height)), 1)
+    n_venues = len(palette)
+    counts, _ = np.histogramdd(
+        (codes, y, x),
+        bins=(n_venues, height, width),
+        range=((-0.5, n_venues - 0.5), y_range, x_range)
+    )
+
+    # Grow single pixels into dots about the size of the regular scatter markers
+    r = DENSITY_SPREAD_PX
+    padded = np.pad(counts, ((0, 0), (r, r), (r, r)))
+    spread = np.zeros_like(counts)
+    for dy in range(-r, r + 1):
+        for dx in range(-r, r + 1):
+            if dy * dy + dx * dx <= r * r:
+                spread += padded[:, r + dy:r + dy + height, r + dx:r + dx + width]
+
+    # Blend venue colors by count per pixel; alpha grows with log density
+    total = spread.sum(axis=0)
+    hit = total > 0
+    rgba = np.zeros((height, width, 4))
+    rgba[..., :3] = np.tensordot(spread, palette[:, :3], axes=(0, 0)) / np.where(hit, total, 1)[..., None]
+    rgba[..., 3] = np.where(hit, 0.7 + 0.3 * np.log1p(total) / np.log1p(total.max()), 0)
+
+    ax.imshow(
+        rgba,
+        extent=[*x_range, *y_range],
+        origin='lower',
+        aspect='auto',
+        interpolation='nearest'
+    )
+    ax.xaxis_date()
+
+
+def compute_stats(df):
+    """Compute overall and per-venue wide_bps stats once for the plot and the summary."""
+    wide_bps = df['wide_bps']
+    quantiles = list(QUANTILES.values())
+
+    overall = pd.concat([
+        wide_bps.agg(['min', 'max']),
+        wide_bps.quantile(quantiles).set_axis(list(QUANTILES))
+    ])
+
+    grouped = df.groupby('venue', observed=True)['wide_bps']
+    venue_quantiles = grouped.quantile(quantiles).unstack().set_axis(list(QUANTILES), axis=1)
+    summary_stats = grouped.agg(['mean', 'min', 'max', 'count']).join(venue_quantiles).round(2)
+
+    return overall, summary_stats
+
+
+def create_scatter_plot(df, overall):
     """Create scatter plot grouped by venue with wide_bps on y-axis."""
 
-    # Ensure block_time is datetime
-    df['block_time'] = pd.to_datetime(df['block_time'])
+    # Map each row to its venue's color so all points go out in one scatter call
+    codes, venues = pd.factorize(df['venue'])
+    palette = plt.cm.tab10(np.arange(len(venues)) % 10)
+    counts = np.bincount(codes, minlength=len(venues))
 
-    # Get unique venues for coloring
-    venues = df['venue'].unique()
-    colors = plt.cm.tab10(range(len(venues)))
-    venue_colors = dict(zip(venues, colors))
+    # Create figure with appropriate size, at the dpi it is saved with
+    fig, ax = plt.subplots(figsize=(14, 8), dpi=IMAGE_DPI)
 
-    # Create figure with appropriate size
-    fig, ax = plt.subplots(figsize=(14, 8))
+    # Fixed margins leave room for the outside legend without a tight-bbox pass at save time
+    fig.subplots_adjust(left=0.06, right=0.80, top=0.90, bottom=0.15)
 
-    # Plot each venue separately for legend
-    for venue in venues:
-        venue_data = df[df['venue'] == venue]
+    # Legend from proxy markers, one per venue
+    handles = []
+    for i, venue in enumerate(venues):
         # Shorten venue name for legend
         short_name = venue[:8] + "..." if len(venue) > 12 else venue
-        ax.scatter(
-            venue_data['block_time'],
-            venue_data['wide_bps'],
-            c=[venue_colors[venue]],
-            label=f"{short_name} ({len(venue_data)})",
+        handles.append(Line2D(
+            [0], [0],
+            marker='o',
+            linestyle='',
+            markerfacecolor=palette[i],
+            markeredgecolor='white',
+            markersize=8,
             alpha=0.7,
-            s=50,
-            edgecolors='white',
-            linewidth=0.5
-        )
+            label=f"{short_name} ({counts[i]})"
+        ))
 
     # Configure y-axis with 0.1 bps increments for clear visualization
-    y_min = df['wide_bps'].min()
-    y_max = df['wide_bps'].max()
+    y_min = overall['min']
+    y_max = overall['max']
 
     # Add some padding
     y_range = y_max - y_min
@@ -85,12 +253,26 @@ def create_scatter_plot(df):
 
     # Set y-axis ticks at 0.1 bps intervals if range is reasonable
     if y_range <= 10:
-        y_ticks = [i/10 for i in range(int((y_min - y_padding) * 10), int((y_max + y_padding) * 10) + 1)]
+        y_ticks = np.arange(np.trunc((y_min - y_padding) * 10), np.trunc((y_max + y_padding) * 10) + 1) / 10
         ax.set_yticks(y_ticks)
     elif y_range <= 50:
-        y_ticks = [i/2 for i in range(int((y_min - y_padding) * 2), int((y_max + y_padding) * 2) + 1)]
+        y_ticks = np.arange(np.trunc((y_min - y_padding) * 2), np.trunc((y_max + y_padding) * 2) + 1) / 2
         ax.set_yticks(y_ticks)
 
+    # Points are drawn once the axes geometry and y limits are final
+    if len(df) > DENSITY_THRESHOLD:
+        draw_density(ax, df, codes, palette)
+    else:
+        ax.scatter(
+            df['block_time'].values,
+            df['wide_bps'].values,
+            c=palette[codes],
+            alpha=0.7,
+            s=50,
+            edgecolors='white',
+            linewidth=0.5
+        )
+
     # Add grid for better readability
     ax.grid(True, alpha=0.3, linestyle='--')
     ax.axhline(y=0, color='red', linestyle='-', alpha=0.5, linewidth=1)
@@ -101,179 +283,246 @@ def create_scatter_plot(df):
     ax.set_title(f'Quote vs Exec Spread by Venue\n(Last 24 hours - {datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M UTC")})', fontsize=14)
 
     # Legend
-    ax.legend(title='Venue (count)', loc='upper left', bbox_to_anchor=(1.02, 1), fontsize=10)
+    ax.legend(handles=handles, title='Venue (count)', loc='upper left', bbox_to_anchor=(1.02, 1), fontsize=10)
 
     # Rotate x-axis labels for better readability
     plt.xticks(rotation=45, ha='right')
 
-    # Tight layout
-    plt.tight_layout()
-
     return fig
 
 
-def upload_to_freeimage(image_bytes):
-    """Upload image to freeimage.host and return the URL."""
-    # Free image hosting API
-    response = requests.post(
-        "https://freeimage.host/api/1/upload",
-        data={
-            "key": "6d207e02198a847aa98d0a2a901485a5",  # Public API key
-            "action": "upload",
-            "source": base64.b64encode(image_bytes).decode('utf-8'),
-            "format": "json"
-        }
+def call_slack_api(method, data):
+    """Call a Slack Web API method with the bot token and return the parsed response."""
+    response = SESSION.post(
+        f"https://slack.com/api/{method}",
+        headers={"Authorization": f"Bearer {SLACK_BOT_TOKEN}"},
+        data=data,
+        timeout=HTTP_TIMEOUT
     )
+    response.raise_for_status()
+
+    result = response.json()
+    if not result.get('ok'):
+        raise RuntimeError(f"Slack {method} failed: {result.get('error')}")
+    return result
+
+
+def upload_to_slack(image_bytes, comment):
+    """Post the chart to the Slack channel via the files v2 upload flow.
+
+    Returns the file ID and permalink, or (None, None) if the upload failed.
+    """
+    try:
+        # Reserve an upload URL, send the raw PNG bytes, then share the file to the channel
+        target = call_slack_api("files.getUploadURLExternal", {
+            "filename": IMAGE_FILENAME,
+            "length": len(image_bytes)
+        })
+
+        response = SESSION.post(target['upload_url'], data=image_bytes, timeout=HTTP_TIMEOUT)
+        response.raise_for_status()
+
+        completed = call_slack_api("files.completeUploadExternal", {
+            "files": json.dumps([{"id": target['file_id'], "title": "Quote vs Exec Spread Scatter Plot"}]),
+            "channel_id": SLACK_CHANNEL_ID,
+            "initial_comment": comment
+        })
+    except (requests.RequestException, RuntimeError) as e:
+        log.warning("Failed to upload chart to Slack: %s", e)
+        return None, None
+
+    # The permalink lets a later unchanged-data report link back to this chart
+    file_id = target['file_id']
+    permalink = next((f.get('permalink') for f in completed.get('files', []) if f.get('id') == file_id), None)
+    if not permalink:
+        try:
+            permalink = call_slack_api("files.info", {"file": file_id})['file'].get('permalink')
+        except (requests.RequestException, RuntimeError, KeyError) as e:
+            log.warning("Could not look up the chart permalink: %s", e)
+
+    return file_id, permalink
+
+
+def post_summary(summary_text):
+    """Post a text-only report, via the bot to SLACK_CHANNEL_ID when configured, else the webhook."""
+    if SLACK_BOT_TOKEN and SLACK_CHANNEL_ID:
+        try:
+            call_slack_api("chat.postMessage", {"channel": SLACK_CHANNEL_ID, "text": summary_text})
+        except (requests.RequestException, RuntimeError) as e:
+            log.error("Failed to send to Slack: %s", e)
+            return False
+
+        log.info("Summary sent to Slack successfully!")
+        return True
+
+    if not SLACK_WEBHOOK_URL:
+        log.error("No Slack destination configured: set SLACK_BOT_TOKEN and SLACK_CHANNEL_ID, or SLACK_WEBHOOK_URL")
+        return False
+
+    payload = {
+        "text": "Quote vs Exec Spread Report",
+        "blocks": [
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": summary_text
+                }
+            }
+        ]
+    }
+
+    try:
+        response = SESSION.post(SLACK_WEBHOOK_URL, json=payload, timeout=HTTP_TIMEOUT)
+    except requests.RequestException as e:
+        log.error("Failed to send to Slack: %s", e)
+        return False
 
     if response.status_code == 200:
-        data = response.json()
-        if data.get('status_code') == 200:
-            return data['image']['url']
-
-    print(f"Failed to upload to freeimage.host: {response.status_code} - {response.text}")
-    return None
-
-
-def upload_to_imgbb(image_bytes):
-    """Upload image to imgbb.com and return the URL."""
-    response = requests.post(
-        "https://api.imgbb.com/1/upload",
-        data={
-            "key": "7a3e5c9f2d8b4e1a6c7d9e0f1a2b3c4d",  # You may need your own key
-            "image": base64.b64encode(image_bytes).decode('utf-8'),
-        }
+        log.info("Summary sent to Slack successfully!")
+    else:
+        log.error("Failed to send to Slack: %s - %s", response.status_code, response.text)
+
+    return response.status_code == 200
+
+
+def format_venue_lines(summary_stats):
+    """Format the per-venue summary rows as Slack mrkdwn lines, column-wise."""
+    venue = pd.Series(summary_stats.index.astype(str), index=summary_stats.index)
+    short_venue = venue.where(venue.str.len() <= 15, venue.str.slice(0, 12) + "...")
+
+    def fmt(column):
+        return summary_stats[column].map('{:.2f}'.format)
+
+    lines = (
+        "• `" + short_venue + "`: mean=" + fmt('mean') + ", min=" + fmt('min')
+        + ", max=" + fmt('max') + ", count=" + summary_stats['count'].astype(int).astype(str) + "\n"
+        + "   Q25=" + fmt('q25') + ", Q50=" + fmt('q50')
+        + ", Q75=" + fmt('q75') + ", Q95=" + fmt('q95') + "\n"
     )
+    return lines.tolist()
 
-    if response.status_code == 200:
-        data = response.json()
-        if data.get('success'):
-            return data['data']['url']
 
-    print(f"Failed to upload to imgbb: {response.status_code}")
-    return None
+def data_hash(df):
+    """Return a fast content hash of the DataFrame (BLAKE2, not for security)."""
+    row_hashes = pd.util.hash_pandas_object(df, index=False).values
+    return hashlib.blake2b(row_hashes.tobytes(), digest_size=16).hexdigest()
 
 
-def upload_image(image_bytes):
-    """Try multiple image hosting services."""
-    # Try freeimage.host first
-    url = upload_to_freeimage(image_bytes)
-    if url:
-        return url
+def load_last_run():
+    """Return the hash and Slack chart recorded by the previous run, if any."""
+    try:
+        with open(LAST_RUN_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
 
-    # Fallback - could add more services here
-    return None
 
+def save_last_run(content_hash, file_id, permalink):
+    """Record this run's data hash and Slack chart for the next run."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(LAST_RUN_PATH, 'w') as f:
+        json.dump({'hash': content_hash, 'file_id': file_id, 'permalink': permalink}, f)
 
-def send_to_slack(fig, df):
-    """Send the plot to Slack as an image."""
 
-    # Save plot to bytes buffer
-    buf = io.BytesIO()
-    fig.savefig(buf, format='png', dpi=150, bbox_inches='tight')
-    buf.seek(0)
-    image_bytes = buf.getvalue()
+def send_to_slack(fig, df, overall, summary_stats, content_hash, previous_chart=None):
+    """Send the report to Slack, with the plot uploaded as a file when a bot token is set.
 
-    # Try to upload image
-    print("Uploading chart to image host...")
-    image_url = upload_image(image_bytes)
+    fig is None when the data is unchanged since the last run; the summary is then sent
+    with a link to the previous chart (previous_chart, a Slack permalink) instead.
+    Returns True only if the full report was delivered.
+    """
+    unchanged = fig is None
 
-    if image_url:
-        print(f"Image uploaded: {image_url}")
-    else:
-        print("Failed to upload image, sending text-only summary")
-
-    # Calculate summary stats with quantiles
-    summary_stats = df.groupby('venue')['wide_bps'].agg([
-        'mean', 'min', 'max', 'count',
-        ('q25', lambda x: x.quantile(0.25)),
-        ('q50', lambda x: x.quantile(0.50)),
-        ('q75', lambda x: x.quantile(0.75)),
-        ('q95', lambda x: x.quantile(0.95))
-    ]).round(2)
-
-    # Calculate overall quantiles
-    overall_q25 = df['wide_bps'].quantile(0.25)
-    overall_q50 = df['wide_bps'].quantile(0.50)
-    overall_q75 = df['wide_bps'].quantile(0.75)
-    overall_q95 = df['wide_bps'].quantile(0.95)
+    if not unchanged:
+        # Save plot to bytes buffer
+        buf = io.BytesIO()
+        fig.savefig(buf, **IMAGE_SAVE_KWARGS)
+        image_bytes = buf.getvalue()
+
+        # Save the plot locally as well, reusing the already rendered bytes
+        Path(IMAGE_FILENAME).write_bytes(image_bytes)
+        log.info("Plot saved as %s", IMAGE_FILENAME)
 
     # Create summary text
     summary_text = f"*Quote vs Exec Spread Report*\n"
-    summary_text += f"_Generated: {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M UTC')}_\n\n"
+    summary_text += f"_Generated: {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M UTC')}_\n"
+    if unchanged:
+        summary_text += f"_No change in data since the previous report; <{previous_chart}|see the previous chart>._\n"
+    summary_text += "\n"
     summary_text += f"*Total Transactions:* {len(df)}\n"
-    summary_text += f"*Wide BPS Range:* {df['wide_bps'].min():.2f} to {df['wide_bps'].max():.2f}\n"
-    summary_text += f"*Quantiles:* Q25={overall_q25:.2f}, Q50={overall_q50:.2f}, Q75={overall_q75:.2f}, Q95={overall_q95:.2f}\n\n"
+    summary_text += f"*Wide BPS Range:* {overall['min']:.2f} to {overall['max']:.2f}\n"
+    summary_text += f"*Quantiles:* Q25={overall['q25']:.2f}, Q50={overall['q50']:.2f}, Q75={overall['q75']:.2f}, Q95={overall['q95']:.2f}\n\n"
 
     # Add per-venue summary
     summary_text += "*Summary by Venue:*\n"
-    for venue, stats in summary_stats.iterrows():
-        short_venue = venue[:12] + "..." if len(venue) > 15 else venue
-        summary_text += f"• `{short_venue}`: mean={stats['mean']:.2f}, min={stats['min']:.2f}, max={stats['max']:.2f}, count={int(stats['count'])}\n"
-        summary_text += f"   Q25={stats['q25']:.2f}, Q50={stats['q50']:.2f}, Q75={stats['q75']:.2f}, Q95={stats['q95']:.2f}\n"
-
-    # Build Slack blocks
-    blocks = [
-        {
-            "type": "section",
-            "text": {
-                "type": "mrkdwn",
-                "text": summary_text
-            }
-        }
-    ]
-
-    # Add image if upload was successful
-    if image_url:
-        blocks.append({
-            "type": "image",
-            "image_url": image_url,
-            "alt_text": "Quote vs Exec Spread Scatter Plot"
-        })
+    summary_text += "".join(format_venue_lines(summary_stats))
 
-    # Send to Slack
-    payload = {
-        "text": "Quote vs Exec Spread Report",
-        "blocks": blocks
-    }
+    if not unchanged:
+        if SLACK_BOT_TOKEN and SLACK_CHANNEL_ID:
+            # Upload the chart straight to Slack with the summary as its message
+            log.info("Uploading chart to Slack...")
+            file_id, permalink = upload_to_slack(image_bytes, summary_text)
 
-    response = requests.post(SLACK_WEBHOOK_URL, json=payload)
+            if file_id:
+                log.info("Report with chart sent to Slack successfully! (file %s)", file_id)
+                if permalink:
+                    save_last_run(content_hash, file_id, permalink)
+                return True
 
-    if response.status_code == 200:
-        print("Report with chart sent to Slack successfully!")
-    else:
-        print(f"Failed to send to Slack: {response.status_code} - {response.text}")
+            log.warning("Failed to upload chart, sending text-only summary")
+            # The summary still goes out, but the run counts as failed
+            post_summary(summary_text)
+            return False
 
-    # Save the plot locally as well
-    fig.savefig('quote_exec_scatter.png', dpi=150, bbox_inches='tight')
-    print("Plot saved as quote_exec_scatter.png")
+        log.warning("SLACK_BOT_TOKEN or SLACK_CHANNEL_ID not set, sending text-only summary")
 
-    return response.status_code == 200
+    return post_summary(summary_text)
 
 
 def main():
     """Main function to fetch data, create plot, and send to Slack."""
-    print(f"Starting quote>exec scatter plot job at {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')}")
+    log.info("Starting quote>exec scatter plot job")
 
-    # Fetch data from Dune
-    df = fetch_dune_data()
+    # Fetch data from Dune (or the local cache)
+    df = load_dune_data()
 
     if df.empty:
-        print("No data fetched from Dune. Exiting.")
+        log.warning("No data fetched from Dune. Exiting.")
         return
 
-    # Print data info
-    print(f"\nData columns: {df.columns.tolist()}")
-    print(f"Venues: {df['venue'].unique().tolist()}")
-    print(f"Wide BPS range: {df['wide_bps'].min():.2f} to {df['wide_bps'].max():.2f}")
+    # Summary stats shared by the plot and the Slack report
+    overall, summary_stats = compute_stats(df)
 
-    # Create scatter plot
-    fig = create_scatter_plot(df)
+    # Log data info (skipped entirely unless INFO is enabled)
+    if log.isEnabledFor(logging.INFO):
+        log.info("Data columns: %s", df.columns.tolist())
+        log.info("Venues: %s", df['venue'].unique().tolist())
+        log.info("Wide BPS range: %.2f to %.2f", overall['min'], overall['max'])
+
+    # Skip rendering and uploading the chart when the data is identical to the previous run,
+    # unless FORCE_REFRESH asks for a fresh report
+    content_hash = data_hash(df)
+    last_run = load_last_run()
+
+    if not FORCE_REFRESH and last_run.get('hash') == content_hash and last_run.get('permalink'):
+        log.info("Data unchanged since last run, skipping chart render and upload")
+        fig = None
+    else:
+        # Create scatter plot
+        fig = create_scatter_plot(df, overall)
 
     # Send to Slack
-    send_to_slack(fig, df)
+    sent = send_to_slack(fig, df, overall, summary_stats, content_hash, last_run.get('permalink'))
+
+    if fig is not None:
+        plt.close(fig)
+
+    if not sent:
+        log.error("Report was not fully delivered to Slack")
+        sys.exit(1)
 
-    plt.close(fig)
-    print("\nJob completed!")
+    log.info("Job completed!")
 
 
 if __name__ == "__main__":